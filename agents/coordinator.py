@@ -1,10 +1,18 @@
 from agents.ingestion_agent import IngestionAgent
 from agents.retrieval_agent import RetrievalAgent
+from agents.remote_retrieval_agent import RemoteRetrievalAgent
 from agents.llm_response_agent import LLMResponseAgent
-from vectorstore.store import SimpleVectorStore
+from vectorstore.collections import VectorStoreCollections
 from mcp.message import create_mcp_message
+from config.settings import (RETRIEVAL_SERVICE_URL, INSTRUMENTATION_ENABLED, INSTRUMENTATION_DUMP_PATH,
+                             PIPELINED_EXECUTION)
+from utils.instrumentation import instrumentation
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
+import atexit
 import logging
+import queue
+import threading
 
 # Setup logging for MCP message tracing
 logging.basicConfig(level=logging.INFO)
@@ -12,27 +20,120 @@ logger = logging.getLogger(__name__)
 
 
 class MCPCoordinator:
-    def __init__(self):
-        self.vector_store = SimpleVectorStore()
+    def __init__(self, retrieval_service_url=RETRIEVAL_SERVICE_URL):
         self.ingestion_agent = IngestionAgent()
-        self.retrieval_agent = RetrievalAgent(self.vector_store)
+        if retrieval_service_url:
+            # Model and indexes live in the shared retrieval service process
+            self.vector_stores = None
+            self.retrieval_agent = RemoteRetrievalAgent(retrieval_service_url)
+        else:
+            # One index per collection (UI session), sharing one embedding model
+            self.vector_stores = VectorStoreCollections()
+            self.retrieval_agent = RetrievalAgent(collections=self.vector_stores)
         self.llm_agent = LLMResponseAgent()
         self.message_history = []  # Track all MCP messages for debugging
 
+        # Wrap MCP handlers; wrappers pass straight through until instrumentation is enabled
+        instrumentation.instrument(self.ingestion_agent, "IngestionAgent", ["process"])
+        instrumentation.instrument(self.retrieval_agent, "RetrievalAgent", ["process", "retrieve"])
+        instrumentation.instrument(self.llm_agent, "LLMResponseAgent", ["process"])
+        if INSTRUMENTATION_ENABLED:
+            instrumentation.configure(enabled=True)
+        if INSTRUMENTATION_DUMP_PATH:
+            atexit.register(self.dump_instrumentation, INSTRUMENTATION_DUMP_PATH)
+
     def log_message(self, message):
         """Log MCP message for tracing"""
         logger.info(
             f"MCP Message: {message['sender']} -> {message['receiver']} | Type: {message['type']} | Trace: {message['trace_id']}")
+        if message["type"] == "DOC_PARSED":
+            # History outlives the request, so keep a summary rather than the chunk table
+            chunks = message["payload"]["chunks"]
+            summary = {"rows": len(chunks), "kb": round(chunks.nbytes() / 1024, 1)}
+            message = dict(message, payload=dict(message["payload"], chunks=summary))
         self.message_history.append(message)
 
-    def run_pipeline(self, file_paths, query):
+    def dump_instrumentation(self, path):
+        """Write the instrumentation report, with the current memory report, to path"""
+        instrumentation.dump(path, {"memory": self.memory_report()})
+        logger.info(f"Instrumentation report written to {path}")
+
+    def memory_report(self):
+        """Approximate size of the state agents keep between requests"""
+        report = {
+            "message_history_messages": len(self.message_history),
+            "llm_chat_history_messages": len(self.llm_agent.chat_history),
+            "llm_chat_history_kb": round(sum(len(m["content"]) for m in self.llm_agent.chat_history) / 1024, 1)
+        }
+        if self.vector_stores is not None:
+            snapshots = [store.snapshot() for store in self.vector_stores.stores().values()]
+            report["collections"] = len(snapshots)
+            report["stored_chunks"] = sum(len(chunks) for chunks, _ in snapshots)
+            report["chunk_table_kb"] = round(sum(chunks.nbytes() for chunks, _ in snapshots) / 1024, 1)
+            report["vector_store_embeddings_kb"] = round(
+                sum(embeddings.nbytes for _, embeddings in snapshots) / 1024, 1)
+        return report
+
+    def ingest_pipelined(self, file_paths, query, trace_id, collection_id=None):
+        """
+        Run ingestion while overlapping the work that does not depend on it:
+        each file's chunks are embedded while the next file parses, the query
+        is encoded and the LLM connection is opened in the background
+        With a remote retrieval service, only the LLM warm-up is overlapped
+        """
+        parsed_files = queue.Queue()
+        vector_store = self.vector_stores.get(collection_id) if self.vector_stores is not None else None
+        prefetching = vector_store is not None
+        if not prefetching:
+            logger.info("Pipelined mode with a retrieval service only overlaps the LLM warm-up")
+
+        # Fire and forget: the warm-up can take seconds and nothing waits on it
+        threading.Thread(target=self.llm_agent.warm_up, daemon=True).start()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            if vector_store is not None:
+                # Warms the query-embedding cache that retrieve() will hit
+                executor.submit(vector_store.encode_queries, [query])
+
+            ingestion_future = executor.submit(
+                self.ingestion_agent.process, file_paths, trace_id, parsed_files.put, collection_id)
+            ingestion_future.add_done_callback(lambda _: parsed_files.put(None))
+
+            # Keep draining the queue after a failure so ingestion can finish
+            while True:
+                file_texts = parsed_files.get()
+                if file_texts is None:
+                    break
+                if not prefetching:
+                    continue
+                try:
+                    vector_store.prefetch_documents(file_texts)
+                except Exception as e:
+                    # Storage embeds whatever was not prefetched, as in sequential mode
+                    logger.warning(f"Prefetching embeddings failed, storing without them: {str(e)}")
+                    prefetching = False
+
+            ingestion_msg = ingestion_future.result()
+            if vector_store is not None and ingestion_msg["type"] != "DOC_PARSED":
+                # Nothing will be stored, so prefetched embeddings would go stale
+                vector_store.discard_prefetched()
+            return ingestion_msg
+
+    def run_pipeline(self, file_paths, query, pipelined=PIPELINED_EXECUTION, collection_id=None):
+        """
+        Answer query from file_paths
+        collection_id (e.g. the UI session id) keeps each caller's documents in its own index
+        """
         # Generate single trace_id for the entire pipeline
         trace_id = str(uuid4())
 
         # Step 1: Ingestion Agent processes documents
         logger.info(f"Starting pipeline with trace_id: {trace_id}")
 
-        ingestion_msg = self.ingestion_agent.process(file_paths, trace_id)
+        if pipelined:
+            ingestion_msg = self.ingest_pipelined(file_paths, query, trace_id, collection_id)
+        else:
+            ingestion_msg = self.ingestion_agent.process(file_paths, trace_id, collection_id=collection_id)
         self.log_message(ingestion_msg)
 
         # Step 2: Retrieval Agent stores documents
@@ -40,7 +141,7 @@ class MCPCoordinator:
         self.log_message(storage_response)
 
         # Step 3: Retrieval Agent retrieves relevant chunks
-        retrieval_msg = self.retrieval_agent.retrieve(query, trace_id)
+        retrieval_msg = self.retrieval_agent.retrieve(query, trace_id, collection_id=collection_id)
         self.log_message(retrieval_msg)
 
         # Step 4: LLM Agent generates final response
@@ -60,6 +161,6 @@ class MCPCoordinator:
 coordinator = MCPCoordinator()
 
 
-def run_pipeline(file_paths, query):
+def run_pipeline(file_paths, query, pipelined=PIPELINED_EXECUTION, collection_id=None):
     """Legacy function for backward compatibility"""
-    return coordinator.run_pipeline(file_paths, query)
\ No newline at end of file
+    return coordinator.run_pipeline(file_paths, query, pipelined=pipelined, collection_id=collection_id)
\ No newline at end of file
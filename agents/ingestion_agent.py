@@ -1,4 +1,5 @@
-from utils.parser_utils import parse_document
+from utils.parser_utils import parse_document_with_pages
+from vectorstore.chunk_table import ChunkTable
 from mcp.message import create_mcp_message
 import logging
 
@@ -6,40 +7,52 @@ logger = logging.getLogger(__name__)
 
 
 class IngestionAgent:
-    def process(self, file_paths, trace_id=None):
+    def process(self, file_paths, trace_id=None, on_file_parsed=None, collection_id=None):
         """
         Parse documents and return MCP message with chunks
+        Chunks travel as a ChunkTable object; only RemoteRetrievalAgent serializes it.
+        on_file_parsed, if given, is called with each file's chunk texts as soon
+        as that file is parsed so callers can start embedding early.
+        collection_id, if given, tells the RetrievalAgent which index to store into
         """
         try:
-            parsed_docs = []
+            texts = []
+            source_files = []
+            chunk_indices = []
+            pages = []  # None for formats without pages
             file_metadata = []
 
             for file_path in file_paths:
                 logger.info(f"Processing file: {file_path}")
-                chunks = parse_document(file_path)
+                chunks = parse_document_with_pages(file_path)
+                filename = file_path.split('/')[-1]  # Just filename
 
                 # Add metadata for each chunk
-                for i, chunk in enumerate(chunks):
-                    parsed_docs.append({
-                        "content": chunk,
-                        "source_file": file_path.split('/')[-1],  # Just filename
-                        "chunk_id": f"{file_path.split('/')[-1]}_chunk_{i}",
-                        "chunk_index": i
-                    })
+                for i, (chunk, page) in enumerate(chunks):
+                    texts.append(chunk)
+                    source_files.append(filename)
+                    chunk_indices.append(i)
+                    pages.append(page)
+
+                if on_file_parsed is not None:
+                    on_file_parsed([chunk for chunk, _ in chunks])
 
                 file_metadata.append({
-                    "filename": file_path.split('/')[-1],
+                    "filename": filename,
                     "chunks_count": len(chunks),
                     "file_type": file_path.split('.')[-1].lower()
                 })
 
+            chunk_table = ChunkTable.build(texts, source_files, chunk_indices, pages)
+
             return create_mcp_message(
                 sender="IngestionAgent",
                 receiver="RetrievalAgent",
                 msg_type="DOC_PARSED",
                 payload={
-                    "chunks": parsed_docs,
-                    "total_chunks": len(parsed_docs),
+                    "chunks": chunk_table,
+                    "total_chunks": len(chunk_table),
+                    "collection_id": collection_id,
                     "files_processed": file_metadata
                 },
                 trace_id=trace_id
@@ -3,15 +3,35 @@ import os
 import requests
 import json
 import logging
-from config.settings import OPENROUTER_API_KEY, LLM_MODEL
+from config.settings import OPENROUTER_API_KEY, LLM_MODEL, CONTEXT_TOKEN_BUDGET, CONTEXT_DUPLICATE_THRESHOLD
+from utils.context_utils import assemble_context, format_context
 
 logger = logging.getLogger(__name__)
 
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
 
 class LLMResponseAgent:
     def __init__(self):
         self.api_key = OPENROUTER_API_KEY
         self.chat_history = []
+        # Connection pool shared by all calls so the TLS connection stays open;
+        # urllib3 pools are thread-safe, requests.Session objects are not
+        self.adapter = requests.adapters.HTTPAdapter()
+
+    def _session(self):
+        """New session for one call, drawing connections from the shared pool"""
+        # Not closed after use: closing a session closes its adapters, i.e. the shared pool
+        session = requests.Session()
+        session.mount("https://", self.adapter)
+        return session
+
+    def warm_up(self):
+        """Open the connection to the LLM API ahead of the first request"""
+        try:
+            self._session().head(OPENROUTER_BASE_URL, timeout=5)
+        except requests.exceptions.RequestException as e:
+            logger.info(f"LLM connection warm-up failed: {str(e)}")
 
     def process(self, retrieval_message):
         """
@@ -36,10 +56,17 @@ class LLMResponseAgent:
             context_metadata = retrieval_message["payload"]["context_metadata"]
             question = retrieval_message["payload"]["query"]
 
+            # Deduplicate, merge adjacent chunks and trim to the token budget
+            context_chunks, context_metadata, packing_stats = assemble_context(
+                context_chunks,
+                context_metadata,
+                similarity=retrieval_message["payload"].get("pairwise_similarity"),
+                token_budget=CONTEXT_TOKEN_BUDGET,
+                similarity_threshold=CONTEXT_DUPLICATE_THRESHOLD
+            )
+
             # Build context with source information
-            formatted_context = ""
-            for i, (chunk, metadata) in enumerate(zip(context_chunks, context_metadata)):
-                formatted_context += f"[Source: {metadata['source_file']}]\n{chunk}\n\n"
+            formatted_context = format_context(context_chunks, context_metadata)
 
             # Create the prompt
             system_prompt = """You are a knowledgeable assistant that answers questions based on provided context. 
@@ -71,8 +98,8 @@ Please provide a comprehensive answer based on the context above. If the context
                 "max_tokens": 1000
             }
 
-            response = requests.post(
-                "https://openrouter.ai/api/v1/chat/completions",
+            response = self._session().post(
+                f"{OPENROUTER_BASE_URL}/chat/completions",
                 headers=headers,
                 data=json.dumps(payload),
                 timeout=30
@@ -97,7 +124,8 @@ Please provide a comprehensive answer based on the context above. If the context
                     "source_metadata": context_metadata,
                     "query": question,
                     "model_used": "mistralai/mistral-7b-instruct",
-                    "context_chunks_used": len(context_chunks)
+                    "context_chunks_used": len(context_chunks),
+                    "context_packing": packing_stats
                 },
                 trace_id=retrieval_message["trace_id"]
             )
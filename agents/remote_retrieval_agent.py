@@ -0,0 +1,71 @@
+from mcp.message import create_mcp_message
+import requests
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteRetrievalAgent:
+    """
+    RetrievalAgent stand-in that forwards MCP messages to a shared
+    retrieval service (see service/retrieval_service.py)
+    """
+
+    def __init__(self, service_url, timeout=60):
+        self.service_url = service_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()  # Reuse the connection across calls
+
+    def _send(self, message):
+        response = self.session.post(f"{self.service_url}/mcp", json=message, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def process(self, ingestion_message):
+        """
+        Send parsed chunks to the service for storage
+        Returns MCP message confirming storage
+        """
+        message = ingestion_message
+        chunks = ingestion_message["payload"].get("chunks")
+        if chunks is not None:
+            # The ChunkTable is only turned into JSON here, where it leaves the process
+            message = dict(ingestion_message, payload=dict(ingestion_message["payload"], chunks=chunks.to_payload()))
+        try:
+            return self._send(message)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Retrieval service request failed: {str(e)}")
+            return create_mcp_message(
+                sender="RetrievalAgent",
+                receiver="Coordinator",
+                msg_type="STORAGE_ERROR",
+                payload={"error": f"Retrieval service request failed: {str(e)}"},
+                trace_id=ingestion_message["trace_id"]
+            )
+
+    def retrieve(self, query, trace_id=None, top_k=5, collection_id=None):
+        """
+        Ask the service for relevant chunks from the given collection
+        Returns MCP message with retrieved context
+        """
+        request_msg = create_mcp_message(
+            sender="Coordinator",
+            receiver="RetrievalAgent",
+            msg_type="RETRIEVAL_REQUEST",
+            payload={"query": query, "top_k": top_k, "collection_id": collection_id},
+            trace_id=trace_id
+        )
+        try:
+            return self._send(request_msg)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Retrieval service request failed: {str(e)}")
+            return create_mcp_message(
+                sender="RetrievalAgent",
+                receiver="LLMResponseAgent",
+                msg_type="RETRIEVAL_ERROR",
+                payload={
+                    "error": f"Retrieval service request failed: {str(e)}",
+                    "query": query
+                },
+                trace_id=trace_id
+            )
@@ -1,3 +1,4 @@
+from vectorstore.chunk_table import ChunkTable
 from mcp.message import create_mcp_message
 import logging
 
@@ -5,9 +6,16 @@ logger = logging.getLogger(__name__)
 
 
 class RetrievalAgent:
-    def __init__(self, vector_store):
+    def __init__(self, vector_store=None, collections=None):
+        # Either one store, or VectorStoreCollections keeping a store per
+        # collection_id so different sessions never see each other's chunks
         self.vector_store = vector_store
-        self.stored_chunks = []  # Keep track of stored chunks with metadata
+        self.collections = collections
+
+    def store_for(self, collection_id=None):
+        if self.collections is not None:
+            return self.collections.get(collection_id)
+        return self.vector_store
 
     def process(self, ingestion_message):
         """
@@ -24,25 +32,24 @@ class RetrievalAgent:
                     trace_id=ingestion_message["trace_id"]
                 )
 
-            chunks_data = ingestion_message["payload"]["chunks"]
-
-            # Extract just the text content for vector store
-            chunk_texts = [chunk["content"] for chunk in chunks_data]
-
-            # Store in vector database
-            self.vector_store.add_documents(chunk_texts)
+            chunk_table = ingestion_message["payload"]["chunks"]
+            if not isinstance(chunk_table, ChunkTable):
+                # Arrived as JSON through the retrieval service
+                chunk_table = ChunkTable.from_payload(chunk_table)
+            vector_store = self.store_for(ingestion_message["payload"].get("collection_id"))
 
-            # Keep metadata for retrieval context
-            self.stored_chunks = chunks_data
+            # Store in vector database, re-embedding only new or changed chunks
+            chunks_embedded = vector_store.set_chunks(chunk_table)
 
-            logger.info(f"Stored {len(chunk_texts)} chunks in vector database")
+            logger.info(f"Stored {len(chunk_table)} chunks in vector database ({chunks_embedded} newly embedded)")
 
             return create_mcp_message(
                 sender="RetrievalAgent",
                 receiver="Coordinator",
                 msg_type="STORAGE_COMPLETE",
                 payload={
-                    "chunks_stored": len(chunk_texts),
+                    "chunks_stored": len(chunk_table),
+                    "chunks_embedded": chunks_embedded,
                     "files_processed": ingestion_message["payload"]["files_processed"]
                 },
                 trace_id=ingestion_message["trace_id"]
@@ -58,30 +65,21 @@ class RetrievalAgent:
                 trace_id=ingestion_message["trace_id"]
             )
 
-    def retrieve(self, query, trace_id=None, top_k=5):
+    def retrieve(self, query, trace_id=None, top_k=5, collection_id=None):
         """
-        Retrieve relevant chunks for query
+        Retrieve relevant chunks for query from the given collection
         Returns MCP message with retrieved context
         """
         try:
-            # Get similar chunks from vector store
-            similar_chunks = self.vector_store.query(query, top_k=top_k)
-
-            # Find metadata for retrieved chunks
-            retrieved_context = []
-            chunk_metadata = []
-
-            for chunk_text in similar_chunks:
-                # Find corresponding metadata
-                for stored_chunk in self.stored_chunks:
-                    if stored_chunk["content"] == chunk_text:
-                        retrieved_context.append(chunk_text)
-                        chunk_metadata.append({
-                            "source_file": stored_chunk["source_file"],
-                            "chunk_id": stored_chunk["chunk_id"],
-                            "chunk_index": stored_chunk["chunk_index"]
-                        })
-                        break
+            vector_store = self.store_for(collection_id)
+
+            # Get rows of similar chunks, plus the table snapshot they index, so a
+            # concurrent re-ingest cannot swap the table between these steps
+            (chunks, embeddings), indices = vector_store.query_snapshot(query, top_k=top_k)
+
+            # Text and metadata come from the snapshot's chunk table by row
+            retrieved_context = [chunks.text(i) for i in indices]
+            chunk_metadata = [chunks.metadata(i) for i in indices]
 
             logger.info(f"Retrieved {len(retrieved_context)} relevant chunks for query: {query[:50]}...")
 
@@ -93,7 +91,12 @@ class RetrievalAgent:
                     "retrieved_context": retrieved_context,
                     "context_metadata": chunk_metadata,
                     "query": query,
-                    "similarity_scores": "cosine_similarity_used"  # Could add actual scores
+                    "similarity_scores": "cosine_similarity_used",  # Could add actual scores
+                    # Hit-to-hit embedding similarity, used to drop near-duplicate context
+                    "pairwise_similarity": [
+                        [round(float(sim), 4) for sim in row]
+                        for row in vector_store.pairwise_similarity(indices, embeddings)
+                    ]
                 },
                 trace_id=trace_id
             )
@@ -1,6 +1,23 @@
+import os
+
 # Model and API configurations
 OPENROUTER_API_KEY = "your-key-here"
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 LLM_MODEL = "mistralai/mistral-7b-instruct"
 VECTOR_STORE_TYPE = "simple"  # or "faiss", "chroma"
-MAX_CHUNKS_RETRIEVAL = 5
\ No newline at end of file
+MAX_CHUNKS_RETRIEVAL = 5
+CONTEXT_TOKEN_BUDGET = 1500  # Approximate prompt tokens allowed for retrieved context
+CONTEXT_DUPLICATE_THRESHOLD = 0.95  # Embedding similarity above which a hit is a near-duplicate
+
+# Set to e.g. http://127.0.0.1:8765 to share one retrieval service across UI workers
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL")
+
+# Overlap parsing, embedding, query encoding and LLM connection set-up in run_pipeline
+# (with RETRIEVAL_SERVICE_URL set, only the LLM connection set-up is overlapped)
+PIPELINED_EXECUTION = os.getenv("PIPELINED_EXECUTION", "False").lower() == "true"
+
+# Record per-stage timings and allocations from startup (can also be toggled in the UI)
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "False").lower() == "true"
+
+# Write the instrumentation report to this file when the process exits (unset to skip)
+INSTRUMENTATION_DUMP_PATH = os.getenv("INSTRUMENTATION_DUMP_PATH")
@@ -0,0 +1,219 @@
+"""
+Standalone retrieval/embedding service
+
+Holds one warm SentenceTransformer so several UI workers can share it. Each
+request names a collection (the UI session id); every collection has its own
+index, so one session's documents never show up in another's results. Agents
+talk to it with MCP messages POSTed as JSON to /mcp:
+
+    DOC_PARSED         -> RetrievalAgent.process  -> STORAGE_COMPLETE / STORAGE_ERROR
+    RETRIEVAL_REQUEST  -> RetrievalAgent.retrieve -> RETRIEVAL_RESULT / RETRIEVAL_ERROR
+
+Encoding is micro-batched across all requests and collections: queries and
+document chunks arriving within a few milliseconds of each other share one
+model call, and large uploads are encoded in slices with queries in between.
+Scoring runs per collection, against that collection's index.
+
+Run with: python -m service.retrieval_service --port 8765
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import Future
+import argparse
+import json
+import logging
+import queue
+import threading
+import time
+
+from sentence_transformers import SentenceTransformer
+import numpy as np
+
+from agents.retrieval_agent import RetrievalAgent
+from vectorstore.collections import VectorStoreCollections
+from mcp.message import create_mcp_message
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class EncodeJob:
+    """Texts queued for BatchingEncoder, with the slices encoded so far"""
+
+    def __init__(self, texts, future):
+        self.texts = texts
+        self.future = future
+        self.encoded = []
+        self.next_text = 0  # Texts before this have been handed to a batch
+
+    @property
+    def remaining(self):
+        return len(self.texts) - self.next_text
+
+
+class BatchingEncoder:
+    """
+    Stand-in for the SentenceTransformer that micro-batches concurrent encode calls
+
+    Queries and document chunks from every collection queue here, so requests
+    arriving within max_wait_ms of each other share one model call. Requests
+    larger than max_batch_size (documents) are encoded a slice at a time, and
+    smaller ones (queries) go first, so a big upload does not hold up queries.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def encode(self, texts):
+        """Queue texts for the next batch and block until their embeddings are ready"""
+        texts = list(texts)
+        if not texts:
+            return np.asarray(self.model.encode([]))
+        future = Future()
+        self._pending.put(EncodeJob(texts, future))
+        return future.result()
+
+    def _collect(self, jobs):
+        """Add newly queued jobs to jobs, waiting up to max_wait for a full batch"""
+        if not jobs:
+            jobs.append(self._pending.get())
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            queued = sum(job.remaining for job in jobs)
+            timeout = deadline - time.monotonic() if queued < self.max_batch_size else 0
+            try:
+                jobs.append(self._pending.get(timeout=timeout) if timeout > 0 else self._pending.get_nowait())
+            except queue.Empty:
+                return
+
+    def _run(self):
+        jobs = []
+        while True:
+            self._collect(jobs)
+
+            # Fill the batch with small requests first, then slices of large ones
+            batch, room = [], self.max_batch_size
+            for job in sorted(jobs, key=lambda job: len(job.texts) > self.max_batch_size):
+                take = min(room, job.remaining)
+                if take <= 0:
+                    break
+                batch.append((job, job.next_text, job.next_text + take))
+                job.next_text += take
+                room -= take
+
+            try:
+                embeddings = np.asarray(self.model.encode(
+                    [t for job, start, end in batch for t in job.texts[start:end]]))
+            except Exception as e:
+                for job, _, _ in batch:
+                    job.future.set_exception(e)
+                failed = {id(job) for job, _, _ in batch}
+                jobs = [job for job in jobs if id(job) not in failed]
+                continue
+
+            offset = 0
+            for job, start, end in batch:
+                job.encoded.append(embeddings[offset:offset + end - start])
+                offset += end - start
+                if job.remaining == 0:
+                    job.future.set_result(np.concatenate(job.encoded))
+            jobs = [job for job in jobs if job.remaining > 0]
+
+
+class MCPRequestHandler(BaseHTTPRequestHandler):
+    retrieval_agent = None  # Set by create_server
+
+    def do_GET(self):
+        if self.path == "/health":
+            stores = self.retrieval_agent.collections.stores()
+            self._send_json(200, {"status": "ok", "collections": len(stores),
+                                  "chunks_stored": sum(len(store.chunks) for store in stores.values())})
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/mcp":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            message = json.loads(self.rfile.read(length))
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {"error": f"Invalid MCP message: {str(e)}"})
+            return
+
+        self._send_json(200, self.handle_message(message))
+
+    def handle_message(self, message):
+        """Dispatch an MCP message to the RetrievalAgent and return its reply"""
+        msg_type = message.get("type")
+        trace_id = message.get("trace_id")
+
+        if msg_type in ("DOC_PARSED", "DOC_PARSE_ERROR"):
+            return self.retrieval_agent.process(message)
+
+        if msg_type == "RETRIEVAL_REQUEST":
+            payload = message.get("payload", {})
+            return self.retrieval_agent.retrieve(payload.get("query", ""), trace_id,
+                                                 top_k=payload.get("top_k", 5),
+                                                 collection_id=payload.get("collection_id"))
+
+        return create_mcp_message(
+            sender="RetrievalService",
+            receiver=message.get("sender", "Coordinator"),
+            msg_type="SERVICE_ERROR",
+            payload={"error": f"Unsupported message type: {msg_type}"},
+            trace_id=trace_id
+        )
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def create_server(host="127.0.0.1", port=8765, max_batch_size=32, max_wait_ms=5):
+    """Build the service around one warm model; call serve_forever() to run it"""
+    encoder = BatchingEncoder(SentenceTransformer("all-MiniLM-L6-v2"), max_batch_size, max_wait_ms)
+    handler = type("BoundMCPRequestHandler", (MCPRequestHandler,),
+                   {"retrieval_agent": RetrievalAgent(collections=VectorStoreCollections(encoder))})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared retrieval/embedding service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    server = create_server(args.host, args.port, args.max_batch_size, args.max_wait_ms)
+    logger.info(f"Retrieval service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down retrieval service")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,11 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import streamlit as st
 from agents import coordinator
+from utils.instrumentation import instrumentation
+from config.settings import INSTRUMENTATION_DUMP_PATH
 import tempfile
 import json
+from uuid import uuid4
 
 st.set_page_config(page_title="📚 Agentic RAG Chatbot", layout="wide")
 st.title("Agentic RAG Chatbot 🤖📄")
@@ -21,6 +24,21 @@ if "message_history" not in st.session_state:
     st.session_state.message_history = []
 if "expanded_messages" not in st.session_state:
     st.session_state.expanded_messages = set()  # Track which message details are shown
+if "collection_id" not in st.session_state:
+    st.session_state.collection_id = str(uuid4())  # Keeps this session's documents in their own index
+
+INSTRUMENTATION_TOGGLES = [
+    ("enabled", "Record stage timings"),
+    ("trace_memory", "Trace allocations (tracemalloc)"),
+    ("count_objects", "Count gc objects"),
+    ("sampling", "Sampling profiler")
+]
+
+
+def apply_instrumentation_toggle(setting, widget_key):
+    """Push a changed checkbox to the shared instrumentation"""
+    instrumentation.configure(**{setting: st.session_state[widget_key]})
+
 
 # Sidebar for file upload and settings
 with st.sidebar:
@@ -38,6 +56,16 @@ with st.sidebar:
     # MCP Message Tracing Toggle
     show_mcp_messages = st.checkbox("🔍 Show MCP Message Flow", value=False)
 
+    # Instrumentation toggles. The settings are process-wide, so they are only
+    # applied when a box is clicked and every session shows the current state
+    with st.expander("🧪 Instrumentation", expanded=False):
+        st.caption("These settings apply to the whole server process, for all sessions.")
+        for setting, label in INSTRUMENTATION_TOGGLES:
+            widget_key = f"instrumentation_{setting}"
+            st.session_state[widget_key] = getattr(instrumentation, setting)
+            st.checkbox(label, key=widget_key, on_change=apply_instrumentation_toggle, args=(setting, widget_key))
+        show_debug_panel = st.checkbox("Show debug panel", value=False)
+
     st.markdown("---")
     st.markdown("### 🏗️ Agent Architecture")
     st.markdown("""
@@ -123,6 +151,43 @@ if show_mcp_messages and col2 is not None:
         else:
             st.info("No messages yet. Upload files and ask a question!")
 
+# Instrumentation debug panel
+if show_debug_panel:
+    st.markdown("### 🧪 Debug Panel")
+    session_state_report = {
+        "chat_history_messages": len(st.session_state.chat_history),
+        "source_chunks": len(st.session_state.source_chunks),
+        "source_chunks_kb": round(sum(len(c) for c in st.session_state.source_chunks) / 1024, 1),
+        "message_history_messages": len(st.session_state.message_history)
+    }
+    memory_report = {"agents": coordinator.coordinator.memory_report(), "session_state": session_state_report}
+
+    debug_col1, debug_col2 = st.columns(2)
+    with debug_col1:
+        st.markdown("**Per-stage totals**")
+        summary = instrumentation.summary()
+        if summary:
+            st.table(summary)
+        else:
+            st.info("No instrumented calls yet. Enable \"Record stage timings\" and ask a question.")
+    with debug_col2:
+        st.markdown("**Retained state**")
+        st.json(memory_report)
+
+    with st.expander("Recent calls", expanded=False):
+        st.json(list(instrumentation.records)[-20:])
+    with st.expander(f"Sampled hot stacks ({instrumentation.samples_taken} samples)", expanded=False):
+        st.json(instrumentation.top_stacks(10))
+
+    st.download_button("💾 Download report", instrumentation.to_json({"memory": memory_report}),
+                       file_name="instrumentation_report.json", mime="application/json")
+    if INSTRUMENTATION_DUMP_PATH and st.button(f"📝 Write report to {INSTRUMENTATION_DUMP_PATH}"):
+        coordinator.coordinator.dump_instrumentation(INSTRUMENTATION_DUMP_PATH)
+        st.success(f"Report written to {INSTRUMENTATION_DUMP_PATH}")
+    if st.button("Reset instrumentation"):
+        instrumentation.reset()
+        st.rerun()
+
 # Chat input - this stays at the bottom
 query = st.chat_input("Ask a question about your documents...")
 
@@ -142,7 +207,8 @@ if query:
                     file_paths.append(path)
 
                 # Run the pipeline
-                response = coordinator.run_pipeline(file_paths, query)
+                response = coordinator.run_pipeline(file_paths, query,
+                                                    collection_id=st.session_state.collection_id)
 
                 # Add assistant response to chat history
                 st.session_state.chat_history.append(("assistant", response["answer"]))
@@ -0,0 +1,145 @@
+import re
+
+# Rough token estimate for English text; avoids pulling in a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Approximate the number of LLM tokens in text"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def format_source(metadata):
+    """Build the citation label for a chunk"""
+    source = metadata['source_file']
+    if metadata.get('page') is not None:
+        source += f", page {metadata['page']}"
+    return source
+
+
+def format_context(chunks, metadata):
+    """Render chunks with their source labels for the prompt"""
+    return "".join(f"[Source: {format_source(meta)}]\n{chunk}\n\n" for chunk, meta in zip(chunks, metadata))
+
+
+def drop_near_duplicates(chunks, metadata, similarity=None, threshold=0.95):
+    """Drop chunks that repeat a higher-ranked chunk, exactly or by embedding similarity"""
+    kept = []
+    seen_texts = set()
+    for i, chunk in enumerate(chunks):
+        if chunk in seen_texts:
+            continue
+        if similarity is not None and any(similarity[i][j] >= threshold for j in kept):
+            continue
+        kept.append(i)
+        seen_texts.add(chunk)
+    return [chunks[i] for i in kept], [metadata[i] for i in kept]
+
+
+def join_overlapping(first, second, max_overlap_words=50):
+    """Join two consecutive chunks, removing the words chunk_text repeated between them"""
+    first_words = first.split()
+    second_words = second.split()
+    for size in range(min(max_overlap_words, len(first_words), len(second_words)), 0, -1):
+        if first_words[-size:] == second_words[:size]:
+            return first + " " + " ".join(second_words[size:])
+    return first + " " + second
+
+
+def merge_adjacent_chunks(chunks, metadata):
+    """Merge chunks from the same source and page whose chunk_index values are consecutive
+
+    Runs never cross a page boundary, so each merged chunk still cites the
+    one page its text came from. Merged chunks keep the rank of their
+    best-ranked member; hits sharing a (source, chunk_index) are kept as is.
+    """
+    def run_key(meta, index):
+        return meta['source_file'], meta.get('page'), index
+
+    positions = {}
+    for rank, meta in enumerate(metadata):
+        positions.setdefault(run_key(meta, meta['chunk_index']), rank)
+
+    merged = []
+    consumed = set()
+    for rank, meta in enumerate(metadata):
+        if rank in consumed:
+            continue
+        if positions[run_key(meta, meta['chunk_index'])] != rank:
+            # Another hit already claimed this chunk position
+            merged.append((chunks[rank], meta))
+            consumed.add(rank)
+            continue
+
+        # Walk back to the start of this run, then forward to its end
+        start = meta['chunk_index']
+        while run_key(meta, start - 1) in positions:
+            start -= 1
+        run = []
+        index = start
+        while run_key(meta, index) in positions:
+            run.append(positions[run_key(meta, index)])
+            index += 1
+
+        text = chunks[run[0]]
+        for member in run[1:]:
+            text = join_overlapping(text, chunks[member])
+        merged_meta = dict(metadata[run[0]])
+        if len(run) > 1:
+            merged_meta['merged_chunk_ids'] = [metadata[member]['chunk_id'] for member in run]
+        merged.append((text, merged_meta))
+        consumed.update(run)
+
+    return [text for text, _ in merged], [meta for _, meta in merged]
+
+
+def trim_to_token_budget(chunks, metadata, token_budget, min_tail_tokens=50, suffix=" ..."):
+    """Keep chunks in rank order until the budget is spent, truncating the last one at a word boundary
+
+    The top-ranked chunk is always kept, truncated to at least min_tail_tokens
+    if the budget is too small for it, so the prompt never loses all context.
+    """
+    kept_chunks, kept_metadata = [], []
+    remaining = token_budget
+    for chunk, meta in zip(chunks, metadata):
+        cost = estimate_tokens(format_context([chunk], [meta]))
+        if cost <= remaining:
+            kept_chunks.append(chunk)
+            kept_metadata.append(meta)
+            remaining -= cost
+            continue
+
+        # Characters left once the source label and the suffix are paid for
+        label_chars = len(format_context([chunk], [meta])) - len(chunk)
+        limit = remaining * CHARS_PER_TOKEN - label_chars - len(suffix)
+        if not kept_chunks:
+            limit = max(limit, min_tail_tokens * CHARS_PER_TOKEN)
+        if limit >= min_tail_tokens * CHARS_PER_TOKEN:
+            truncated = re.sub(r'\s+\S*$', '', chunk[:limit])
+            kept_chunks.append(truncated + suffix)
+            kept_metadata.append(meta)
+        break
+
+    return kept_chunks, kept_metadata
+
+
+def assemble_context(chunks, metadata, similarity=None, token_budget=1500, similarity_threshold=0.95):
+    """
+    Deduplicate, merge and trim retrieved chunks before they go into the prompt
+    Returns (chunks, metadata, stats)
+    """
+    tokens_before = estimate_tokens(format_context(chunks, metadata))
+
+    packed_chunks, packed_metadata = drop_near_duplicates(chunks, metadata, similarity, similarity_threshold)
+    duplicates_dropped = len(chunks) - len(packed_chunks)
+    packed_chunks, packed_metadata = merge_adjacent_chunks(packed_chunks, packed_metadata)
+    packed_chunks, packed_metadata = trim_to_token_budget(packed_chunks, packed_metadata, token_budget)
+
+    tokens_after = estimate_tokens(format_context(packed_chunks, packed_metadata))
+    return packed_chunks, packed_metadata, {
+        "chunks_in": len(chunks),
+        "chunks_out": len(packed_chunks),
+        "duplicates_dropped": duplicates_dropped,
+        "context_tokens": tokens_after,
+        "context_tokens_saved": tokens_before - tokens_after
+    }
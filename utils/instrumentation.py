@@ -0,0 +1,235 @@
+"""
+Opt-in instrumentation for MCP handlers
+
+Wrapped handlers record wall time, CPU time, tracemalloc allocation deltas and
+gc object counts per call. A sampling profiler can be switched on at runtime to
+find hot stacks in threads running a wrapped handler. Everything is a no-op pass-through while disabled.
+"""
+
+from collections import Counter, deque
+import functools
+import gc
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+
+# Keep the instrumentation's own bookkeeping out of allocation diffs
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, tracemalloc.__file__)
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Instrumentation:
+    def __init__(self, max_records=500):
+        self.enabled = False
+        self.trace_memory = False
+        self.count_objects = False
+        self.records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._sampler_stop = threading.Event()
+        self._active_threads = Counter()  # Thread id -> depth of wrapped stages it is in
+        self.sample_interval = 0.005
+        self.samples = Counter()
+        self.samples_taken = 0
+
+    def configure(self, enabled=None, trace_memory=None, count_objects=None, sampling=None):
+        """Toggle instrumentation features at runtime; None leaves a setting unchanged"""
+        if enabled is not None:
+            self.enabled = enabled
+        if trace_memory is not None:
+            self.trace_memory = trace_memory
+            if trace_memory and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            elif not trace_memory and tracemalloc.is_tracing():
+                tracemalloc.stop()
+        if count_objects is not None:
+            self.count_objects = count_objects
+        if sampling is not None:
+            if sampling:
+                self.start_sampling()
+            else:
+                self.stop_sampling()
+
+    def instrument(self, obj, stage_prefix, method_names):
+        """Replace obj's methods with instrumented wrappers named '<stage_prefix>.<method>'"""
+        for name in method_names:
+            setattr(obj, name, self.wrap(f"{stage_prefix}.{name}", getattr(obj, name)))
+
+    def wrap(self, stage, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled and self._sampler is None:
+                return func(*args, **kwargs)
+            # Mark this thread as inside a stage so the sampler only records handler work
+            thread_id = threading.get_ident()
+            with self._lock:
+                self._active_threads[thread_id] += 1
+            try:
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                return self._run_measured(stage, func, args, kwargs)
+            finally:
+                with self._lock:
+                    self._active_threads[thread_id] -= 1
+                    if not self._active_threads[thread_id]:
+                        del self._active_threads[thread_id]
+        return wrapper
+
+    def _run_measured(self, stage, func, args, kwargs):
+        # Measurement errors (e.g. tracing switched off by another session
+        # mid-call) are logged and never change what the handler returns or raises
+        try:
+            start = self._start_measurement()
+        except Exception as e:
+            logger.warning(f"Instrumentation could not measure {stage}: {str(e)}")
+            start = None
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if start is not None:
+                try:
+                    self._record(stage, start)
+                except Exception as e:
+                    logger.warning(f"Instrumentation could not record {stage}: {str(e)}")
+
+    def _start_measurement(self):
+        trace_memory = self.trace_memory and tracemalloc.is_tracing()
+        start = {
+            "objects": len(gc.get_objects()) if self.count_objects else None,
+            "snapshot": tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS) if trace_memory else None
+        }
+        if trace_memory:
+            tracemalloc.reset_peak()
+        start["wall"] = time.perf_counter()
+        start["cpu"] = time.thread_time()
+        return start
+
+    def _record(self, stage, start):
+        record = {
+            "stage": stage,
+            "timestamp": time.time(),
+            "wall_time_ms": round((time.perf_counter() - start["wall"]) * 1000, 3),
+            "cpu_time_ms": round((time.thread_time() - start["cpu"]) * 1000, 3)
+        }
+        if start["snapshot"] is not None and tracemalloc.is_tracing():
+            snapshot_after = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+            diff = snapshot_after.compare_to(start["snapshot"], "lineno")
+            record["alloc_net_kb"] = round(sum(stat.size_diff for stat in diff) / 1024, 1)
+            record["alloc_peak_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            record["top_allocations"] = [
+                {"location": str(stat.traceback[0]), "size_diff_kb": round(stat.size_diff / 1024, 1),
+                 "count_diff": stat.count_diff}
+                for stat in diff[:5]
+            ]
+        if start["objects"] is not None:
+            record["objects_delta"] = len(gc.get_objects()) - start["objects"]
+        with self._lock:
+            self.records.append(record)
+
+    def start_sampling(self, interval=None):
+        """Start a background thread that samples the stacks of threads running a wrapped stage"""
+        if interval is not None:
+            self.sample_interval = interval
+        if self._sampler is not None and self._sampler.is_alive():
+            return
+        self._sampler_stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="instrumentation-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop_sampling(self):
+        if self._sampler is not None:
+            self._sampler_stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    @property
+    def sampling(self):
+        return self._sampler is not None and self._sampler.is_alive()
+
+    def _sample_loop(self, max_depth=12):
+        while not self._sampler_stop.wait(self.sample_interval):
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active_threads)
+            # Only threads inside a wrapped stage; idle server threads would swamp the counts
+            for thread_id in active:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename}:{frame.f_lineno} ({code.co_name})")
+                    frame = frame.f_back
+                with self._lock:
+                    self.samples[tuple(reversed(stack))] += 1
+                    self.samples_taken += 1
+
+    def summary(self):
+        """Aggregate records per stage"""
+        with self._lock:
+            records = list(self.records)
+        stages = {}
+        for record in records:
+            stage = stages.setdefault(record["stage"], {
+                "stage": record["stage"], "calls": 0, "wall_time_ms": 0.0, "cpu_time_ms": 0.0,
+                "max_wall_time_ms": 0.0, "alloc_net_kb": 0.0, "objects_delta": 0
+            })
+            stage["calls"] += 1
+            stage["wall_time_ms"] += record["wall_time_ms"]
+            stage["cpu_time_ms"] += record["cpu_time_ms"]
+            stage["max_wall_time_ms"] = max(stage["max_wall_time_ms"], record["wall_time_ms"])
+            stage["alloc_net_kb"] += record.get("alloc_net_kb", 0.0)
+            stage["objects_delta"] += record.get("objects_delta", 0)
+        for stage in stages.values():
+            stage["avg_wall_time_ms"] = round(stage["wall_time_ms"] / stage["calls"], 3)
+            for key in ("wall_time_ms", "cpu_time_ms", "alloc_net_kb"):
+                stage[key] = round(stage[key], 3)
+        return list(stages.values())
+
+    def top_stacks(self, limit=20):
+        """Most frequently sampled stacks, innermost frame last"""
+        with self._lock:
+            common = self.samples.most_common(limit)
+            total = self.samples_taken
+        return [
+            {"samples": count, "share": round(count / total, 4) if total else 0.0, "stack": list(stack)}
+            for stack, count in common
+        ]
+
+    def report(self, extra=None):
+        report = {
+            "summary": self.summary(),
+            "records": list(self.records),
+            "sampling": {"samples_taken": self.samples_taken, "top_stacks": self.top_stacks()}
+        }
+        if extra:
+            report.update(extra)
+        return report
+
+    def to_json(self, extra=None):
+        return json.dumps(self.report(extra), indent=2, default=str)
+
+    def dump(self, path, extra=None):
+        """Write the full report to a JSON file"""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json(extra))
+        return path
+
+    def reset(self):
+        with self._lock:
+            self.records.clear()
+            self.samples.clear()
+            self.samples_taken = 0
+
+
+# Shared instance used by the coordinator and UI
+instrumentation = Instrumentation()
@@ -1,9 +1,19 @@
 import os
 from PyPDF2 import PdfReader
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, StreamObject
 from docx import Document
 from pptx import Presentation
+from collections import OrderedDict
 import csv
+import hashlib
 import re
+import threading
+
+# Extracted page text keyed by a hash of the page's content stream and
+# resources, so re-uploading a revised PDF only re-extracts changed pages
+PDF_PAGE_CACHE_SIZE = 4096
+_pdf_page_cache = OrderedDict()
+_pdf_page_cache_lock = threading.Lock()  # Shared by Streamlit session threads
 
 
 def clean_text(text):
@@ -49,20 +59,106 @@ def chunk_text(text, max_chunk_size=500, overlap=50):
     return chunks
 
 
+def _hash_pdf_object(obj, digest, ref_digests):
+    """Feed a PDF object and everything it references into digest
+
+    Streams contribute their raw encoded bytes, so nothing is decompressed.
+    Each indirect object is hashed once and its digest kept in ref_digests,
+    so fonts and XObjects shared between pages are not hashed again.
+    """
+    if isinstance(obj, IndirectObject):
+        ref = (obj.idnum, obj.generation)
+        if ref not in ref_digests:
+            ref_digests[ref] = b"cycle"  # Placeholder while ref is being hashed
+            ref_digest = hashlib.sha1()
+            _hash_pdf_object(obj.get_object(), ref_digest, ref_digests)
+            ref_digests[ref] = ref_digest.digest()
+        digest.update(ref_digests[ref])
+        return
+
+    if isinstance(obj, StreamObject):
+        digest.update(b"stream")
+        digest.update(obj._data or b"")
+    if isinstance(obj, DictionaryObject):
+        digest.update(b"<<")
+        for key in sorted(obj.keys()):
+            if key in ("/Parent", "/P"):  # Back-references up the page tree
+                continue
+            digest.update(key.encode("utf-8"))
+            _hash_pdf_object(obj.raw_get(key), digest, ref_digests)
+        digest.update(b">>")
+    elif isinstance(obj, ArrayObject):
+        digest.update(b"[")
+        for item in obj:
+            _hash_pdf_object(item, digest, ref_digests)
+        digest.update(b"]")
+    else:
+        digest.update(repr(obj).encode("utf-8"))
+
+
+def page_content_hash(page, ref_digests=None):
+    """
+    Hash a PDF page's content streams together with its resources
+
+    Resources (fonts with their ToUnicode maps, form and image XObjects) are
+    hashed recursively, since pages like "q /Fm0 Do Q" share a content stream
+    but draw different text. Pass one ref_digests dict for all pages of a
+    reader to reuse digests of shared objects. Returns None on malformed pages.
+    """
+    if ref_digests is None:
+        ref_digests = {}
+    digest = hashlib.sha1()
+    try:
+        for key in ("/Contents", "/Resources"):
+            digest.update(key.encode("utf-8"))
+            _hash_pdf_object(page.raw_get(key) if key in page else None, digest, ref_digests)
+    except Exception:
+        return None
+    return digest.hexdigest()
+
+
+def extract_page_text(page, ref_digests=None):
+    """Extract text from a PDF page, reusing the cached result for unchanged pages"""
+    key = page_content_hash(page, ref_digests)
+    if key is None:
+        return page.extract_text() or ""
+    with _pdf_page_cache_lock:
+        page_text = _pdf_page_cache.get(key)
+        if page_text is not None:
+            _pdf_page_cache.move_to_end(key)
+            return page_text
+
+    # Extract outside the lock so other sessions' lookups are not held up
+    page_text = page.extract_text() or ""
+    with _pdf_page_cache_lock:
+        _pdf_page_cache[key] = page_text
+        while len(_pdf_page_cache) > PDF_PAGE_CACHE_SIZE:
+            _pdf_page_cache.popitem(last=False)
+    return page_text
+
+
 def parse_document(file_path):
     """Parse document and return meaningful chunks"""
+    return [chunk for chunk, _ in parse_document_with_pages(file_path)]
+
+
+def parse_document_with_pages(file_path):
+    """Parse document and return (chunk, page_number) pairs
+
+    PDFs are chunked page by page so each chunk carries its 1-based page
+    number; PPTX chunks carry their slide number. Other formats have no
+    pages and use None.
+    """
     try:
         if file_path.endswith(".pdf"):
             reader = PdfReader(file_path)
-            full_text = ""
-            for page in reader.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    full_text += page_text + "\n"
-
-            # Clean and chunk the full text
-            clean_full_text = clean_text(full_text)
-            return chunk_text(clean_full_text)
+            chunks = []
+            ref_digests = {}  # Digests of objects shared between this reader's pages
+            for page_num, page in enumerate(reader.pages):
+                clean_page_text = clean_text(extract_page_text(page, ref_digests))
+                for chunk in chunk_text(clean_page_text):
+                    chunks.append((chunk, page_num + 1))
+            return chunks
 
         elif file_path.endswith(".docx"):
             doc = Document(file_path)
@@ -72,7 +168,7 @@ def parse_document(file_path):
                     full_text += para.text + "\n"
 
             clean_full_text = clean_text(full_text)
-            return chunk_text(clean_full_text)
+            return [(chunk, None) for chunk in chunk_text(clean_full_text)]
 
         elif file_path.endswith(".pptx"):
             prs = Presentation(file_path)
@@ -87,7 +183,7 @@ def parse_document(file_path):
                 if slide_text.strip():
                     clean_slide_text = clean_text(slide_text)
                     # For presentations, keep slide-based chunks but clean them
-                    chunks.append(f"[Slide {slide_num + 1}] {clean_slide_text}")
+                    chunks.append((f"[Slide {slide_num + 1}] {clean_slide_text}", slide_num + 1))
 
             return chunks
 
@@ -99,7 +195,7 @@ def parse_document(file_path):
 
                 if headers:
                     # Create a summary chunk with headers
-                    chunks.append(f"CSV Headers: {', '.join(headers)}")
+                    chunks.append((f"CSV Headers: {', '.join(headers)}", None))
 
                     # Group rows into meaningful chunks
                     row_batch = []
@@ -112,12 +208,12 @@ def parse_document(file_path):
                             row_batch.append(row_text)
 
                             if len(row_batch) >= batch_size:
-                                chunks.append("\n".join(row_batch))
+                                chunks.append(("\n".join(row_batch), None))
                                 row_batch = []
 
                     # Add remaining rows
                     if row_batch:
-                        chunks.append("\n".join(row_batch))
+                        chunks.append(("\n".join(row_batch), None))
 
             return chunks
 
@@ -136,9 +232,9 @@ def parse_document(file_path):
                     if section:
                         # Further chunk large sections
                         if len(section) > 1000:
-                            chunks.extend(chunk_text(section))
+                            chunks.extend((chunk, None) for chunk in chunk_text(section))
                         else:
-                            chunks.append(section)
+                            chunks.append((section, None))
                 return chunks
             else:
                 # For plain text, use paragraph-based chunking
@@ -153,13 +249,13 @@ def parse_document(file_path):
 
                     if len(current_chunk) + len(para) > 800:
                         if current_chunk:
-                            chunks.append(current_chunk)
+                            chunks.append((current_chunk, None))
                         current_chunk = para
                     else:
                         current_chunk += "\n\n" + para if current_chunk else para
 
                 if current_chunk:
-                    chunks.append(current_chunk)
+                    chunks.append((current_chunk, None))
 
                 return chunks
 
@@ -167,4 +263,4 @@ def parse_document(file_path):
 
     except Exception as e:
         print(f"Error parsing {file_path}: {str(e)}")
-        return [f"Error parsing file {os.path.basename(file_path)}: {str(e)}"]
\ No newline at end of file
+        return [(f"Error parsing file {os.path.basename(file_path)}: {str(e)}", None)]
\ No newline at end of file
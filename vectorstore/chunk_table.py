@@ -0,0 +1,144 @@
+import hashlib
+import sys
+import numpy as np
+
+NO_PAGE = -1  # Stored in the page column for formats without pages
+
+
+def text_hash(data):
+    """64-bit hash of UTF-8 chunk text, stable across processes"""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class ChunkTable:
+    """
+    Columnar store for chunk text and metadata
+    Texts share one UTF-8 buffer addressed by byte offsets; row i matches row i of the embedding matrix
+    """
+
+    def __init__(self, buffer=b"", offsets=None, source_files=None, source_ids=None,
+                 chunk_indices=None, pages=None, hashes=None):
+        self.buffer = buffer
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else np.asarray(offsets, dtype=np.int64)
+        self.source_files = [None if s is None else sys.intern(s) for s in source_files] if source_files else []
+        count = len(self.offsets) - 1
+        self.source_ids = self._column(source_ids, count)
+        self.chunk_indices = self._column(chunk_indices, count)
+        self.pages = self._column(pages, count, fill=NO_PAGE)
+        if hashes is not None:
+            self.hashes = np.asarray(hashes, dtype=np.uint64)
+        else:
+            self.hashes = np.fromiter((text_hash(self.text_bytes(i)) for i in range(count)),
+                                      dtype=np.uint64, count=count)
+
+    @staticmethod
+    def _column(values, count, fill=0):
+        if values is None:
+            return np.full(count, fill, dtype=np.int32)
+        return np.asarray(values, dtype=np.int32)
+
+    @classmethod
+    def build(cls, texts, source_files=None, chunk_indices=None, pages=None):
+        """
+        Build a table from parallel per-chunk lists
+        source_files holds one filename per chunk; pages may contain None
+        """
+        encoded = [t.encode("utf-8") for t in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+
+        source_names, source_ids = [], None
+        if source_files is not None:
+            ids_by_name = {}
+            source_ids = [ids_by_name.setdefault(name, len(ids_by_name)) for name in source_files]
+            source_names = list(ids_by_name)
+        if chunk_indices is None:
+            chunk_indices = range(len(texts))
+        if pages is not None:
+            pages = [NO_PAGE if page is None else page for page in pages]
+
+        return cls(b"".join(encoded), offsets, source_names, source_ids, list(chunk_indices), pages)
+
+    @classmethod
+    def concat(cls, tables):
+        """Stack tables row-wise, remapping source ids onto one shared source list"""
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls()
+
+        ids_by_name = {}
+        offsets, source_ids = [np.zeros(1, dtype=np.int64)], []
+        base = 0
+        for table in tables:
+            # Tables built without source files read as a single None source
+            remap = np.array([ids_by_name.setdefault(name, len(ids_by_name))
+                              for name in table.source_files or [None]], dtype=np.int32)
+            source_ids.append(remap[table.source_ids])
+            offsets.append(table.offsets[1:] + base)
+            base += int(table.offsets[-1])
+
+        return cls(b"".join(table.buffer for table in tables), np.concatenate(offsets), list(ids_by_name),
+                   np.concatenate(source_ids), np.concatenate([table.chunk_indices for table in tables]),
+                   np.concatenate([table.pages for table in tables]),
+                   np.concatenate([table.hashes for table in tables]))
+
+    def append_texts(self, texts):
+        """New table with texts added as rows without a source, numbered after the existing rows"""
+        added = ChunkTable.build(texts, chunk_indices=range(len(self), len(self) + len(texts)))
+        return ChunkTable.concat([self, added])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def text_bytes(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1]]
+
+    def text(self, i):
+        return self.text_bytes(i).decode("utf-8")
+
+    def iter_texts(self):
+        for i in range(len(self)):
+            yield self.text(i)
+
+    def source_file(self, i):
+        return self.source_files[self.source_ids[i]] if self.source_files else None
+
+    def page(self, i):
+        page = int(self.pages[i])
+        return None if page == NO_PAGE else page
+
+    def metadata(self, i):
+        """Metadata for one chunk in the dict shape used in MCP payloads"""
+        source_file = self.source_file(i)
+        chunk_index = int(self.chunk_indices[i])
+        return {
+            "source_file": source_file,
+            "chunk_id": f"chunk_{chunk_index}" if source_file is None else f"{source_file}_chunk_{chunk_index}",
+            "chunk_index": chunk_index,
+            "page": self.page(i)
+        }
+
+    def nbytes(self):
+        """Approximate memory held by the table"""
+        return (sys.getsizeof(self.buffer) + self.offsets.nbytes + self.source_ids.nbytes
+                + self.chunk_indices.nbytes + self.pages.nbytes + self.hashes.nbytes
+                + sum(sys.getsizeof(s) for s in self.source_files if s is not None))
+
+    def to_payload(self):
+        """
+        JSON-serializable form for MCP messages
+        The buffer travels as text; offsets stay byte offsets into its UTF-8 encoding
+        """
+        return {
+            "buffer": self.buffer.decode("utf-8"),
+            "offsets": self.offsets.tolist(),
+            "source_files": self.source_files,
+            "source_ids": self.source_ids.tolist(),
+            "chunk_indices": self.chunk_indices.tolist(),
+            "pages": self.pages.tolist()
+        }
+
+    @classmethod
+    def from_payload(cls, payload):
+        return cls(payload["buffer"].encode("utf-8"), payload["offsets"], payload["source_files"],
+                   payload["source_ids"], payload["chunk_indices"], payload["pages"])
@@ -0,0 +1,41 @@
+from sentence_transformers import SentenceTransformer
+from vectorstore.store import QueryEmbeddingCache, SimpleVectorStore
+from collections import OrderedDict
+import threading
+
+DEFAULT_COLLECTION = "default"
+
+
+class VectorStoreCollections:
+    """
+    Separate SimpleVectorStores per collection (e.g. one per UI session),
+    all sharing one embedding model and one query-embedding cache, so the
+    model is loaded once and repeated questions hit across sessions
+    """
+
+    def __init__(self, model=None, max_collections=64, query_cache_size=256):
+        self.model = model or SentenceTransformer("all-MiniLM-L6-v2")
+        self.query_cache = QueryEmbeddingCache(query_cache_size)
+        self.max_collections = max_collections
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, collection_id=None):
+        """Store for collection_id, created on first use; least recently used ones are evicted"""
+        collection_id = collection_id or DEFAULT_COLLECTION
+        with self._lock:
+            store = self._stores.get(collection_id)
+            if store is None:
+                store = SimpleVectorStore(model=self.model, query_cache=self.query_cache)
+                self._stores[collection_id] = store
+                while len(self._stores) > self.max_collections:
+                    self._stores.popitem(last=False)
+            self._stores.move_to_end(collection_id)
+            return store
+
+    def stores(self):
+        with self._lock:
+            return dict(self._stores)
+
+    def __len__(self):
+        return len(self._stores)
@@ -1,20 +1,190 @@
 from sklearn.metrics.pairwise import cosine_similarity
 from sentence_transformers import SentenceTransformer
+from vectorstore.chunk_table import ChunkTable, text_hash
+from collections import OrderedDict
 import numpy as np
+import threading
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of query string -> embedding, shareable between stores using one model"""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # Shared by Streamlit session threads
+
+    def get_many(self, queries):
+        """Cached embeddings for whichever of queries are present"""
+        found = {}
+        with self._lock:
+            for q in queries:
+                if q in self._entries:
+                    self._entries.move_to_end(q)
+                    found[q] = self._entries[q]
+        return found
+
+    def put_many(self, embeddings_by_query):
+        with self._lock:
+            self._entries.update(embeddings_by_query)
+            for q in embeddings_by_query:
+                self._entries.move_to_end(q)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
 
 class SimpleVectorStore:
-    def __init__(self):
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
-        self.texts = []
-        self.embeddings = []
+    def __init__(self, query_cache_size=256, model=None, query_cache=None):
+        # Pass a model and query cache to share them across stores (see VectorStoreCollections)
+        self.model = model or SentenceTransformer("all-MiniLM-L6-v2")
+        # (ChunkTable, embedding matrix) sharing row numbers; replaced as one
+        # tuple so readers never pair a new table with old embeddings
+        self._snapshot = (ChunkTable(), np.empty((0, 0), dtype=np.float32))
+        # Persistent text-hash -> row index of the current table, kept as
+        # sorted arrays so re-ingest lookups never rebuild per-chunk strings
+        self._sorted_hashes = np.empty(0, dtype=np.uint64)
+        self._hash_rows = np.empty(0, dtype=np.int64)
+        self._write_lock = threading.Lock()
+        # Repeated questions skip the model
+        self.query_cache = query_cache if query_cache is not None else QueryEmbeddingCache(query_cache_size)
+        # Embeddings keyed by text hash, computed ahead of the next set_chunks call
+        self._prefetched = {}
+
+    @property
+    def chunks(self):
+        return self._snapshot[0]
+
+    @property
+    def embeddings(self):
+        return self._snapshot[1]
+
+    def snapshot(self):
+        """The current (chunks, embeddings) pair"""
+        return self._snapshot
+
+    def _rows_for_hashes(self, hashes):
+        """Row of each hash in the current table, or -1 where it is not stored"""
+        if len(self._sorted_hashes) == 0:
+            return np.full(len(hashes), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_hashes, hashes), len(self._sorted_hashes) - 1)
+        found = self._sorted_hashes[pos] == hashes
+        return np.where(found, self._hash_rows[pos], -1)
 
     def add_documents(self, texts):
-        new_embeddings = self.model.encode(texts)
-        self.texts.extend(texts)
-        self.embeddings.extend(new_embeddings)
+        """Append texts that carry no metadata, keeping the stored rows as they are"""
+        self.set_chunks(self.chunks.append_texts(texts))
+
+    def prefetch_documents(self, texts):
+        """Embed texts ahead of set_chunks, e.g. while other files are still parsing"""
+        by_hash = {text_hash(t.encode("utf-8")): t for t in texts}
+        hashes = np.fromiter(by_hash, dtype=np.uint64, count=len(by_hash))
+        with self._write_lock:
+            rows = self._rows_for_hashes(hashes)
+            missing = [int(h) for h, row in zip(hashes, rows) if row < 0 and int(h) not in self._prefetched]
+        if missing:
+            embeddings = self.model.encode([by_hash[h] for h in missing])
+            with self._write_lock:
+                self._prefetched.update(zip(missing, embeddings))
+        return len(missing)
+
+    def discard_prefetched(self):
+        """Drop prefetched embeddings that will not be stored"""
+        with self._write_lock:
+            self._prefetched = {}
+
+    def set_documents(self, texts):
+        """Replace stored documents with texts that carry no metadata"""
+        return self.set_chunks(ChunkTable.build(texts))
+
+    def set_chunks(self, chunks):
+        """Replace the stored ChunkTable, only encoding texts that are not already embedded"""
+        with self._write_lock:
+            _, old_embeddings = self._snapshot
+            rows = self._rows_for_hashes(chunks.hashes)
+            encoded, self._prefetched = self._prefetched, {}
+
+            missing = {}  # text hash -> first row in the new table
+            for i in np.flatnonzero(rows < 0):
+                h = int(chunks.hashes[i])
+                if h not in encoded and h not in missing:
+                    missing[h] = i
+            if missing:
+                encoded.update(zip(missing, self.model.encode([chunks.text(i) for i in missing.values()])))
+
+            stored = rows >= 0
+            if len(chunks) == 0:
+                embeddings = np.empty((0, 0), dtype=np.float32)
+            else:
+                dim = old_embeddings.shape[1] if stored.any() else len(next(iter(encoded.values())))
+                embeddings = np.empty((len(chunks), dim), dtype=np.float32)
+                if stored.any():
+                    embeddings[stored] = old_embeddings[rows[stored]]
+                for i in np.flatnonzero(~stored):
+                    embeddings[i] = encoded[int(chunks.hashes[i])]
+
+            self._snapshot = (chunks, embeddings)
+            order = np.argsort(chunks.hashes, kind="stable")
+            self._sorted_hashes = chunks.hashes[order]
+            self._hash_rows = order
+            return len(missing)
+
+    def encode_queries(self, queries):
+        """Encode queries in one model call, serving repeats from the LRU cache"""
+        unique = list(dict.fromkeys(queries))
+        found = self.query_cache.get_many(unique)
+
+        # Encode outside the cache lock; results are kept locally so a concurrent
+        # eviction cannot remove them before they are returned
+        missing = [q for q in unique if q not in found]
+        if missing:
+            encoded = dict(zip(missing, self.model.encode(missing)))
+            self.query_cache.put_many(encoded)
+            found.update(encoded)
+
+        return np.asarray([found[q] for q in queries])
+
+    def pairwise_similarity(self, indices, embeddings=None):
+        """Cosine similarity between embeddings at the given rows (of a snapshot, if given)"""
+        if embeddings is None:
+            embeddings = self.embeddings
+        if len(indices) == 0:
+            return np.zeros((0, 0))
+        selected = embeddings[list(indices)]
+        return cosine_similarity(selected, selected)
 
     def query(self, q, top_k=3):
-        q_emb = self.model.encode([q])[0]
-        sims = cosine_similarity([q_emb], self.embeddings)[0]
-        top_indices = np.argsort(sims)[-top_k:][::-1]
-        return [self.texts[i] for i in top_indices]
\ No newline at end of file
+        return self.query_batch([q], top_k=top_k)[0]
+
+    def query_batch(self, queries, top_k=3):
+        """Return the top_k texts for each query"""
+        snapshot = self._snapshot
+        chunks = snapshot[0]
+        return [[chunks.text(i) for i in row] for row in self.query_indices_batch(queries, top_k, snapshot)]
+
+    def query_indices(self, q, top_k=3):
+        return self.query_indices_batch([q], top_k=top_k)[0]
+
+    def query_snapshot(self, q, top_k=3):
+        """Top_k rows for q together with the (chunks, embeddings) snapshot they index"""
+        snapshot = self._snapshot
+        return snapshot, self.query_indices_batch([q], top_k, snapshot)[0]
+
+    def query_indices_batch(self, queries, top_k=3, snapshot=None):
+        """Return the top_k chunk rows for each query, scored with a single matrix product"""
+        chunks, embeddings = snapshot or self._snapshot
+        if not queries:
+            return []
+        if len(chunks) == 0 or top_k <= 0:
+            return [[] for _ in queries]
+
+        q_embs = self.encode_queries(queries)
+        sims = cosine_similarity(q_embs, embeddings)
+
+        k = min(top_k, sims.shape[1])
+        # argpartition finds the top k in linear time; only those k get sorted
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1)
+        return np.take_along_axis(top, order, axis=1).tolist()